@@ -0,0 +1,317 @@
+"""
+Build fake Elasticsearch snapshot repositories and time ElasticSnap on them.
+
+Usage:
+  ElasticSnapBench.py --generate --folder=<folder> [--snapshots=<n>] [--indices=<n>] [--shards=<n>] [--files=<n>] [--file-size=<KiB>] [--size-sigma=<sigma>] [--part-size=<KiB>] [--share=<ratio>] [--seed=<n>] [--no-checksums]
+  ElasticSnapBench.py --run --folder=<folder> --out=<file> [--script=<file>] [--commands=<list>] [--jobs=<n>] [--repeat=<n>] [--work=<folder>]
+  ElasticSnapBench.py --compare <before> <after>
+
+Options:
+  --snapshots=<n>       Snapshots in the repository [default: 20]
+  --indices=<n>         Indices in every snapshot [default: 10]
+  --shards=<n>          Shards of every index [default: 2]
+  --files=<n>           Files of a shard in one snapshot [default: 10]
+  --file-size=<KiB>     Median file size, sizes are log-normal around it [default: 64]
+  --size-sigma=<sigma>  Spread of the file sizes, 0 makes them all the median [default: 1.5]
+  --part-size=<KiB>     Split files larger than this in .partN blobs, 0 never
+                        splits [default: 0]
+  --share=<ratio>       Part of the files of a shard a snapshot takes over
+                        from the snapshot before it [default: 0.8]
+  --seed=<n>            Seed of the random generator [default: 1]
+  --no-checksums        Leave out the checksums-<uuid>.json files that
+                        ElasticSnap writes, like a repository elasticsearch wrote
+  --out=<file>          Json file the results are written to
+  --script=<file>       ElasticSnap.py to time, so a checkout of another
+                        commit can be run against the same repository. The
+                        one next to this file by default
+  --commands=<list>     Comma separated, out of list, plan, copy, sync, verify
+                        and disk-usage [default: list,plan,copy,sync,verify,disk-usage]
+  --jobs=<n>            --jobs passed to ElasticSnap [default: 4]
+  --repeat=<n>          Runs of every command, the median wall time is kept [default: 3]
+  --work=<folder>       Where destination repositories are made, they are
+                        removed after every run. The temporary folder by default
+
+"""
+
+import json
+import os
+import sys
+import time
+import random
+import base64
+import struct
+import zlib
+import shutil
+import subprocess
+import tempfile
+import statistics
+from docopt import docopt
+
+import ElasticSnap
+
+
+#Runs ElasticSnap.py with the arguments after it and, when it exits, writes
+# its /proc/self/io to the file named in ELASTICSNAP_BENCH_IO
+IO_WRAPPER = '''
+import atexit, os, runpy, sys
+def Report():
+  try:
+    with open('/proc/self/io') as f:
+      Data = f.read()
+  except OSError:
+    Data = ''
+  with open(os.environ['ELASTICSNAP_BENCH_IO'], 'w') as f:
+    f.write(Data)
+atexit.register(Report)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+#random bytes the file contents are cut from
+PoolSize = 16 * 1024 * 1024
+
+
+#A uuid the way elasticsearch writes them, 22 characters of base64url
+def NewUUID(Random):
+  return base64.urlsafe_b64encode(Random.randbytes(16)).decode('ascii').rstrip('=')
+
+
+#Metadata blob with a codec header, SMILE content (deflated when Compress)
+# and a lucene footer
+def MakeBlob(Codec, Value, Compress = False):
+  Template = struct.pack('>I', ElasticSnap.CODEC_MAGIC) + bytes([len(Codec)]) + Codec.encode('ascii') + struct.pack('>I', 1)
+  if Compress:
+    Template += b'DFL\0'
+  return ElasticSnap.EncodeBlob(Template, Value)
+
+
+def WriteFile(FileName, Data):
+  with open(FileName, mode='wb') as f:
+    f.write(Data)
+
+
+#A segment file of Size bytes ending in a lucene footer, and its lucene
+# checksum the way elasticsearch records it
+def MakeSegment(Random, Pool, Size):
+  Size = max(Size, 32)
+  Body = bytearray()
+  Offset = Random.randrange(PoolSize)
+  while len(Body) < Size - 16:
+    Body += Pool[Offset:Offset + Size - 16 - len(Body)]
+    Offset = 0
+  Body += struct.pack('>II', ElasticSnap.FOOTER_MAGIC, 0)
+  Checksum = zlib.crc32(Body)
+  return bytes(Body) + struct.pack('>Q', Checksum), ElasticSnap.ToBase36(Checksum)
+
+
+#Write a segment file as one blob, or as .partN blobs larger than PartSize
+def WriteSegment(ShardFolder, FileInfo, Data):
+  PartSize = FileInfo.get('part_size')
+  if not PartSize or len(Data) <= PartSize:
+    WriteFile(ShardFolder + '/' + FileInfo['name'], Data)
+    return
+  for Part in range((len(Data) + PartSize - 1) // PartSize):
+    WriteFile(ShardFolder + '/' + FileInfo['name'] + '.part' + str(Part), Data[Part * PartSize:(Part + 1) * PartSize])
+
+
+#Build a repository the way elasticsearch 7.x lays it out: index.latest,
+# index-N with index_metadata_identifiers, global meta-/snap- blobs, and for
+# every index its meta blob (shared while the metadata is unchanged) and per
+# shard the segment blobs, a snap-<uuid>.dat and the shard generation file.
+# Every snapshot takes over Share of the files of each shard from the one
+# before it, the rest are new.
+def GenerateRepository(Folder, Snapshots, Indices, Shards, Files, FileSize, SizeSigma, PartSize, Share, Seed, Checksums):
+  Random = random.Random(Seed)
+  Pool = Random.randbytes(PoolSize)
+  os.makedirs(Folder + '/indices', exist_ok=True)
+  Start = 1700000000000
+
+  IndexIds = [ (NewUUID(Random), NewUUID(Random)) for Index in range(Indices) ]
+  Index = { 'snapshots': [], 'indices': {}, 'index_metadata_identifiers': {}, 'min_version': '7.10.2' }
+  ShardFiles = {} #(index, shard) -> file infos of the last snapshot
+  ShardHistory = {} #(index, shard) -> {snapshot name: file names}
+  ShardInfos = {} #(index, shard) -> {file name: file info}
+  Bytes = 0
+  for Snapshot in range(Snapshots):
+    SnapshotName = 'snapshot-%05d' % Snapshot
+    snapshotUUID = NewUUID(Random)
+    StartTime = Start + Snapshot * 3600000
+    Lookup = {}
+    for IndexNumber, (IndexId, IndexUUID) in enumerate(IndexIds):
+      IndexName = 'index-%05d' % IndexNumber
+      IndexFolder = Folder + '/indices/' + IndexId
+      #the index metadata changes every tenth snapshot
+      Identifier = '%s-_na_-%s-1-1' % (IndexUUID, Snapshot // 10 + 1)
+      if Identifier not in Index['index_metadata_identifiers']:
+        Blob = NewUUID(Random)
+        Index['index_metadata_identifiers'][Identifier] = Blob
+        os.makedirs(IndexFolder, exist_ok=True)
+        WriteFile(IndexFolder + '/meta-' + Blob + '.dat', MakeBlob('index-metadata', { IndexName: { 'version': Snapshot // 10 + 1, 'settings': { 'index.number_of_shards': str(Shards), 'index.uuid': IndexUUID } } }, Compress=True))
+      Lookup[IndexId] = Identifier
+      Index['indices'].setdefault(IndexName, { 'id': IndexId, 'snapshots': [], 'shard_generations': [] })['snapshots'].append(snapshotUUID)
+      for Shard in range(Shards):
+        ShardFolder = IndexFolder + '/' + str(Shard)
+        os.makedirs(ShardFolder, exist_ok=True)
+        Key = (IndexId, Shard)
+        Kept = [ FileInfo for FileInfo in ShardFiles.get(Key, []) if Random.random() < Share ][:Files]
+        FileInfos = list(Kept)
+        while len(FileInfos) < Files:
+          Size = int(FileSize * Random.lognormvariate(0, SizeSigma))
+          Data, Checksum = MakeSegment(Random, Pool, Size)
+          FileInfo = { 'name': '__' + NewUUID(Random), 'physical_name': '_%s.cfs' % ElasticSnap.ToBase36(Random.randrange(1 << 32)), 'length': len(Data), 'checksum': Checksum, 'written_by': '8.7.0' }
+          if PartSize:
+            FileInfo['part_size'] = PartSize
+          WriteSegment(ShardFolder, FileInfo, Data)
+          Bytes += len(Data)
+          FileInfos.append(FileInfo)
+        ShardFiles[Key] = FileInfos
+        #the commit point is kept inside the metadata, it has no blob
+        Virtual = { 'name': 'v__' + NewUUID(Random), 'physical_name': 'segments_%s' % (Snapshot + 1), 'length': 300, 'checksum': ElasticSnap.ToBase36(Random.randrange(1 << 32)), 'meta_hash': Random.randbytes(300), 'written_by': '8.7.0' }
+        AllInfos = FileInfos + [ Virtual ]
+        WriteFile(ShardFolder + '/snap-' + snapshotUUID + '.dat', MakeBlob('snapshot', { 'name': SnapshotName, 'index_version': Snapshot + 1, 'start_time': StartTime, 'time': 1000, 'number_of_files': len(AllInfos), 'total_size': sum(FileInfo['length'] for FileInfo in AllInfos), 'files': AllInfos }, Compress=Shard % 2 == 1))
+        ShardHistory.setdefault(Key, {})[SnapshotName] = [ FileInfo['name'] for FileInfo in AllInfos ]
+        ShardInfos.setdefault(Key, {}).update((FileInfo['name'], FileInfo) for FileInfo in AllInfos)
+    WriteFile(Folder + '/meta-' + snapshotUUID + '.dat', MakeBlob('metadata', { 'meta-data': { 'version': Snapshot + 1, 'cluster_uuid': 'bench' } }, Compress=True))
+    WriteFile(Folder + '/snap-' + snapshotUUID + '.dat', MakeBlob('snapshot', { 'snapshot': { 'name': SnapshotName, 'uuid': snapshotUUID, 'version_id': 7100299, 'indices': [ 'index-%05d' % IndexNumber for IndexNumber in range(Indices) ], 'state': 'SUCCESS', 'start_time': StartTime, 'end_time': StartTime + 60000, 'total_shards': Indices * Shards, 'successful_shards': Indices * Shards, 'failures': [] } }, Compress=True))
+    Index['snapshots'].append({ 'name': SnapshotName, 'uuid': snapshotUUID, 'state': 1, 'index_metadata_lookup': Lookup, 'version': '7.10.2' })
+
+  #one shard generation file for every shard, with all the snapshots in it
+  for IndexName, IndexInfo in Index['indices'].items():
+    for Shard in range(Shards):
+      Key = (IndexInfo['id'], Shard)
+      Generation = NewUUID(Random)
+      Live = set(Name for Names in ShardHistory[Key].values() for Name in Names)
+      WriteFile(Folder + '/indices/' + IndexInfo['id'] + '/' + str(Shard) + '/index-' + Generation, MakeBlob('snapshots', { 'files': [ FileInfo for Name, FileInfo in ShardInfos[Key].items() if Name in Live ], 'snapshots': dict((SnapshotName, { 'files': Names }) for SnapshotName, Names in ShardHistory[Key].items()) }))
+      IndexInfo['shard_generations'].append(Generation)
+
+  Generation = Snapshots
+  with open(Folder + '/index-' + str(Generation), 'w') as f:
+    json.dump(Index, f)
+  ElasticSnap.WriteIndexLatest(Folder + '/index.latest', Generation)
+
+  if Checksums:
+    Repo = ElasticSnap.Repository(Folder)
+    for snapshot in Repo.Index['snapshots']:
+      SnapshotChecksums = {}
+      for RelFile in ElasticSnap.ListSnapShotFiles(Repo, None, snapshot['uuid']):
+        file_sha1, filesize = ElasticSnap.CalcChecksum(Folder + '/' + RelFile)
+        SnapshotChecksums[RelFile] = { 'sha1': file_sha1, 'size': filesize }
+      ElasticSnap.WriteChecksums(Folder, snapshot['uuid'], SnapshotChecksums)
+    ElasticSnap.GetSnapshotSummaries(Repo)
+
+  Parameters = { 'snapshots': Snapshots, 'indices': Indices, 'shards': Shards, 'files': Files, 'file_size_kib': FileSize // 1024, 'size_sigma': SizeSigma, 'part_size_kib': PartSize // 1024, 'share': Share, 'seed': Seed, 'checksums': Checksums, 'segment_bytes': Bytes }
+  with open(Folder + '/elasticsnap-bench.json', 'w') as f:
+    json.dump(Parameters, f)
+  return Parameters
+
+
+#Run one command of ElasticSnap and measure it: wall time, peak RSS, and
+# bytes read and written (rchar/wchar count every read and write,
+# read_bytes/write_bytes only what reached the disk)
+def TimeCommand(Script, Arguments):
+  IoFile = tempfile.NamedTemporaryFile(suffix='.io', delete=False)
+  IoFile.close()
+  Start = time.time()
+  Process = subprocess.Popen([ sys.executable, '-c', IO_WRAPPER, Script ] + Arguments, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=dict(os.environ, ELASTICSNAP_BENCH_IO=IoFile.name))
+  Stderr = Process.stderr.read()
+  Pid, Status, Usage = os.wait4(Process.pid, 0)
+  Wall = time.time() - Start
+  Process.returncode = os.waitstatus_to_exitcode(Status)
+  Process.stderr.close()
+  Result = { 'wall_s': round(Wall, 3), 'max_rss_kb': Usage.ru_maxrss, 'exit': Process.returncode }
+  with open(IoFile.name) as f:
+    for Line in f:
+      Name, Value = Line.split(':')
+      if Name in ('rchar', 'wchar', 'read_bytes', 'write_bytes'):
+        Result[Name] = int(Value)
+  os.remove(IoFile.name)
+  if Process.returncode != 0:
+    Result['error'] = Stderr.decode('utf-8', 'replace')[-2000:]
+  return Result
+
+
+#Arguments of every benchmark, with Dest a new empty folder for each run
+def CommandArguments(Command, Folder, Dest, FirstSnapshot, Jobs):
+  if Command == 'list':
+    return [ '--list-snapshots', '--folder=' + Folder ]
+  if Command == 'plan':
+    return [ '--plan', '--src=' + Folder, '--dst=' + Dest, '--throughput=100', '--jobs=' + Jobs ]
+  if Command == 'copy':
+    return [ '--copy', '--src=' + Folder, '--dst=' + Dest, '--name=' + FirstSnapshot, '--jobs=' + Jobs ]
+  if Command == 'sync':
+    return [ '--sync', '--src=' + Folder, '--dst=' + Dest, '--jobs=' + Jobs ]
+  if Command == 'verify':
+    return [ '--verify', '--folder=' + Folder, '--level=full', '--jobs=' + Jobs ]
+  if Command == 'disk-usage':
+    return [ '--disk-usage', '--folder=' + Folder, '--jobs=' + Jobs ]
+  print ("unknown command %s" % Command)
+  sys.exit(1)
+
+
+def GitCommit(Folder):
+  try:
+    return subprocess.run([ 'git', '-C', Folder, 'rev-parse', 'HEAD' ], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+#Time every command Repeat times against the repository in Folder
+def RunBenchmarks(Folder, Script, Commands, Jobs, Repeat, Work):
+  Repo = ElasticSnap.Repository(Folder)
+  FirstSnapshot = sorted(Repo.Index['snapshots'], key=ElasticSnap.SnapshotSortName)[0]['name']
+  try:
+    with open(Folder + '/elasticsnap-bench.json') as f:
+      Parameters = json.load(f)
+  except (OSError, ValueError):
+    Parameters = None
+  Results = { 'script': os.path.abspath(Script), 'commit': GitCommit(os.path.dirname(os.path.abspath(Script))), 'python': sys.version.split()[0], 'time': int(time.time()), 'jobs': int(Jobs), 'repository': Parameters, 'commands': {} }
+  for Command in Commands:
+    Runs = []
+    for Run in range(Repeat):
+      Dest = tempfile.mkdtemp(prefix='elasticsnap-bench-', dir=Work)
+      #caches ElasticSnap keeps in the repository would make later runs cheaper
+      if os.path.exists(Folder + '/elasticsnap-usage.json'):
+        os.remove(Folder + '/elasticsnap-usage.json')
+      Runs.append(TimeCommand(Script, CommandArguments(Command, Folder, Dest, FirstSnapshot, Jobs)))
+      shutil.rmtree(Dest)
+    Walls = [ Run['wall_s'] for Run in Runs ]
+    Results['commands'][Command] = { 'median_s': round(statistics.median(Walls), 3), 'runs': Runs }
+    print ("%12s : %8s s median of %s, %8s MB peak RSS, %s MB read, %s MB written%s" % (Command, Results['commands'][Command]['median_s'], Repeat, round(max(Run['max_rss_kb'] for Run in Runs) / 1024, 1), round(Runs[-1].get('rchar', 0) / 1024 / 1024, 1), round(Runs[-1].get('wchar', 0) / 1024 / 1024, 1), '' if all(Run['exit'] == 0 for Run in Runs) else ', FAILED'))
+  return Results
+
+
+#Median wall time and peak RSS of two result files side by side
+def CompareResults(Before, After):
+  print ("%12s %10s %10s %7s %10s %10s" % ("command", "before s", "after s", "ratio", "before MB", "after MB"))
+  for Command in Before['commands']:
+    if Command not in After['commands']:
+      continue
+    A = Before['commands'][Command]
+    B = After['commands'][Command]
+    Ratio = round(B['median_s'] / A['median_s'], 2) if A['median_s'] else None
+    #a command the older script does not know has nothing to compare
+    if any(Run['exit'] != 0 for Run in A['runs'] + B['runs']):
+      Ratio = 'failed'
+    print ("%12s %10s %10s %7s %10s %10s" % (Command, A['median_s'], B['median_s'], Ratio, round(max(Run['max_rss_kb'] for Run in A['runs']) / 1024, 1), round(max(Run['max_rss_kb'] for Run in B['runs']) / 1024, 1)))
+
+
+def main():
+  options = docopt(__doc__)
+  if options['--generate']:
+    Parameters = GenerateRepository(options['--folder'], int(options['--snapshots']), int(options['--indices']), int(options['--shards']), int(options['--files']), int(options['--file-size']) * 1024, float(options['--size-sigma']), int(options['--part-size']) * 1024, float(options['--share']), int(options['--seed']), not options['--no-checksums'])
+    print ("Generated %s snapshots of %s indices, %s GB of segment files" % (Parameters['snapshots'], Parameters['indices'], round(Parameters['segment_bytes'] / 1024 / 1024 / 1024, 2)))
+  elif options['--run']:
+    Script = options['--script'] or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ElasticSnap.py')
+    Results = RunBenchmarks(options['--folder'], Script, options['--commands'].split(","), options['--jobs'], int(options['--repeat']), options['--work'])
+    with open(options['--out'], 'w') as f:
+      json.dump(Results, f, indent=1)
+  elif options['--compare']:
+    with open(options['<before>']) as f:
+      Before = json.load(f)
+    with open(options['<after>']) as f:
+      After = json.load(f)
+    CompareResults(Before, After)
+
+
+if __name__ == "__main__":
+  main()
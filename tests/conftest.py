@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+#the scripts are not a package, the tests import them from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ElasticSnap
+import ElasticSnapBench
+
+
+#A small repository the way elasticsearch 7.x writes it, with checksums:
+# 5 snapshots of 2 indices with 2 shards, some files split in .partN blobs
+@pytest.fixture
+def repository(tmp_path):
+  Folder = str(tmp_path / 'repo')
+  ElasticSnapBench.GenerateRepository(Folder, 5, 2, 2, 4, 16 * 1024, 1.0, 32 * 1024, 0.5, 1, True)
+  return Folder
+
+
+#A clock for ElasticSnap that only moves when it sleeps or a test moves it
+class Clock:
+  def __init__(self):
+    self.Now = 1000.0
+    self.Slept = []
+
+  def monotonic(self):
+    return self.Now
+
+  def time(self):
+    return self.Now
+
+  def perf_counter(self):
+    return self.Now
+
+  def sleep(self, Seconds):
+    self.Slept.append(Seconds)
+    self.Now += Seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  Fake = Clock()
+  monkeypatch.setattr(ElasticSnap, 'time', Fake)
+  return Fake
@@ -0,0 +1,61 @@
+import struct
+import zlib
+
+import pytest
+
+import ElasticSnap
+import ElasticSnapBench
+
+
+#Values of every kind the SMILE writer knows, at the edges of its encodings
+Values = [
+  None, True, False, 0, 15, -16, 16, -17, 2**31 - 1, -2**31, 2**31, -2**63, 2**63 - 1,
+  0.5, -1e300, '', 'a', 'x' * 32, 'x' * 33, 'x' * 200, 'é', 'é' * 16, 'é' * 17, 'é' * 100,
+  b'', b'\x00\xff' * 50, [], [1, [2, [3]]], {}, { '': 1, 'n' * 64: 2, 'n' * 65: 3, 'é': 4, 'é' * 28: 5, 'é' * 29: 6 },
+]
+
+
+@pytest.mark.parametrize('Value', Values)
+def test_smile_round_trip(Value):
+  assert ElasticSnap.SmileDecoder(ElasticSnap.SmileEncoder().Encode(Value)).Decode() == Value
+
+
+#elasticsearch writes shared names and values, the writer never does
+def test_smile_back_references():
+  Names = b':)\n\x01' + b'\xf8\xfa\x80a\xc2\xfb\xfa\x40\xc4\xfb\xf9'
+  assert ElasticSnap.SmileDecoder(Names).Decode() == [ { 'a': 1 }, { 'a': 2 } ]
+  Shared = b':)\n\x02' + b'\xf8\x41ab\x01\xf9'
+  assert ElasticSnap.SmileDecoder(Shared).Decode() == [ 'ab', 'ab' ]
+  with pytest.raises(ValueError):
+    ElasticSnap.SmileDecoder(b':)\n\x00' + b'\xf8\x01\xf9').Decode()
+
+
+def test_smile_truncated():
+  Data = ElasticSnap.SmileEncoder().Encode({ 'files': [ 'a' * 40 ] })
+  with pytest.raises(ValueError):
+    ElasticSnap.SmileDecoder(Data[:-3]).Decode()
+
+
+@pytest.mark.parametrize('Compress', [ False, True ])
+def test_blob_round_trip(Compress):
+  Value = { 'snapshots': { 'snapshot-1': { 'files': [ '__a', '__b' ], 'shard_state_id': 'x' } }, 'files': [ { 'name': '__a', 'length': 10 } ] }
+  Template = ElasticSnapBench.MakeBlob('snapshots', {}, Compress=Compress)
+  Data = ElasticSnap.EncodeBlob(Template, Value)
+  assert ElasticSnap.DecodeBlob(Data) == Value
+  #codec header kept, content compressed like the template
+  Pos = 5 + Template[4] + 4
+  assert Data[:Pos] == Template[:Pos]
+  assert (Data[Pos:Pos + 4] == b'DFL\0') == Compress
+  #lucene footer: magic, algorithm 0 and the crc32 of everything before it
+  Magic, Algorithm, Checksum = struct.unpack('>IIQ', Data[-16:])
+  assert (Magic, Algorithm) == (ElasticSnap.FOOTER_MAGIC, 0)
+  assert Checksum == zlib.crc32(Data[:-8])
+
+
+def test_blob_json_content():
+  Template = ElasticSnapBench.MakeBlob('snapshot', {})
+  Pos = 5 + Template[4] + 4
+  Data = Template[:Pos] + b'{"files": [1, 2]}' + bytes(16)
+  assert ElasticSnap.DecodeBlob(Data) == { 'files': [ 1, 2 ] }
+  with pytest.raises(ValueError):
+    ElasticSnap.DecodeBlob(b'\x00' * 4 + Data[4:])
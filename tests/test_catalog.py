@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import ElasticSnap
+
+
+@pytest.fixture
+def folders(repository, tmp_path):
+  Other = str(tmp_path / 'other')
+  os.makedirs(Other)
+  SrcRepo = ElasticSnap.Repository(repository)
+  ElasticSnap.SyncSnapShots(SrcRepo, ElasticSnap.Repository(Other), [ SrcRepo.ByName[Name]['uuid'] for Name in ('snapshot-00001', 'snapshot-00003') ])
+  return repository, Other
+
+
+def Found(Catalog, Pattern, Folders):
+  return [ (IndexName, os.path.basename(Folder), SnapshotName) for IndexName, Folder, SnapshotName, snapshotUUID in Catalog.Find(Pattern, Folders) ]
+
+
+def test_find_indices(folders, tmp_path, monkeypatch, capsys):
+  Repo, Other = folders
+  Catalog = ElasticSnap.IndexCatalog(str(tmp_path / 'catalog' / 'indices.db'))
+  assert ElasticSnap.FindIndices(Catalog, 'index-*1', [ Repo, Other ])
+  Output = capsys.readouterr().out
+  assert 'Cataloged %s' % Repo in Output and 'Cataloged %s' % Other in Output
+  assert '1 indices in 7 snapshots of 2 repositories' in Output
+
+  #GLOB wildcards, case sensitive, and only in the repositories asked for
+  assert Found(Catalog, 'index-0000[0]', [ Other ]) == [ ('index-00000', 'other', 'snapshot-00001'), ('index-00000', 'other', 'snapshot-00003') ]
+  assert len(Found(Catalog, '*', [ Repo, Other ])) == 14
+  assert len(Found(Catalog, 'index-?????', [ Repo ])) == 10
+  assert Found(Catalog, 'INDEX-*', [ Repo, Other ]) == []
+  assert Found(Catalog, 'index-00000', [ str(tmp_path / 'unknown') ]) == []
+  assert not ElasticSnap.FindIndices(Catalog, 'missing-*', [ Repo, Other ])
+  assert 'No snapshot in 2 repositories holds an index matching missing-*' in capsys.readouterr().out
+
+  #a relative folder is the same repository
+  monkeypatch.chdir(os.path.dirname(Other))
+  assert not Catalog.Refresh('other')
+  assert Catalog.Folders() == sorted([ Repo, Other ])
+  Catalog.Close()
+
+
+def test_catalog_refresh(folders, tmp_path):
+  Repo, Other = folders
+  FileName = str(tmp_path / 'indices.db')
+  Catalog = ElasticSnap.IndexCatalog(FileName)
+  assert Catalog.Refresh(Repo) and Catalog.Refresh(Other)
+  assert not Catalog.Refresh(Other)
+  Catalog.Close()
+
+  #the catalog is kept, a repository is only read again when it changed
+  Catalog = ElasticSnap.IndexCatalog(FileName)
+  assert not Catalog.Refresh(Repo)
+  OtherRepo = ElasticSnap.Repository(Other)
+  ElasticSnap.DeleteSnapShots(OtherRepo, [ OtherRepo.ByName['snapshot-00001']['uuid'] ])
+  assert Catalog.Refresh(Other)
+  assert Found(Catalog, '*', [ Other ]) == [ ('index-00000', 'other', 'snapshot-00003'), ('index-00001', 'other', 'snapshot-00003') ]
+  assert len(Found(Catalog, '*', [ Repo ])) == 10
+  assert Catalog.Names([ Other ]) == { 'index-00000', 'index-00001' }
+  Catalog.Close()
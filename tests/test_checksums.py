@@ -0,0 +1,107 @@
+import io
+import json
+
+import pytest
+
+import ElasticSnap
+
+
+Document = {
+  'a': 1, 'b': -2.5e10, 'c': 12345678901234567890, 'd': 'text with "quotes", \\ and é中',
+  'e': [ 1, [ 2, { 'f': None } ], True, False ], 'g': {}, 'h': [], 'long': 'x' * 5000, '': 0,
+}
+
+
+#the standard library parser, with chunks small enough to cut every token
+@pytest.mark.parametrize('ChunkSize', [ 1, 3, 7, 64, 1024 * 1024 ])
+def test_stream_json_without_ijson(monkeypatch, ChunkSize):
+  monkeypatch.setattr(ElasticSnap, 'ijson', None)
+  for Text in (json.dumps(Document), json.dumps(Document, indent=3), '{}', ' { } '):
+    Items = list(ElasticSnap.StreamJSONObject(io.BytesIO(Text.encode('utf-8')), ChunkSize=ChunkSize))
+    assert dict(Items) == json.loads(Text)
+    assert [ Key for Key, Value in Items ] == list(json.loads(Text))
+
+
+@pytest.mark.parametrize('Text', [ '', '[1]', '{"a": 1', '{"a": 1,}', '{"a" 1}', '{"a": 12' ])
+def test_stream_json_without_ijson_broken(monkeypatch, Text):
+  monkeypatch.setattr(ElasticSnap, 'ijson', None)
+  with pytest.raises(ValueError):
+    list(ElasticSnap.StreamJSONObject(io.BytesIO(Text.encode('utf-8')), ChunkSize=2))
+
+
+#text reads the parser makes, it never buffers much more than its largest
+class ReadSizes(io.TextIOWrapper):
+  Largest = 0
+
+  def read(self, Size = -1):
+    Data = super().read(Size)
+    ReadSizes.Largest = max(ReadSizes.Largest, len(Data))
+    return Data
+
+
+def test_stream_json_split(monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'ijson', None)
+  monkeypatch.setattr(ElasticSnap.io, 'TextIOWrapper', ReadSizes)
+  Index = { 'snapshots': [ { 'name': 'snapshot-%s' % Number, 'uuid': 'u' * 22 } for Number in range(50) ], 'indices': dict(('index-%s' % Number, { 'id': 'i' * 22, 'snapshots': [ 'u' * 22 ] * 10, 'shard_generations': [ 'g' * 22, 1 ] }) for Number in range(50)), 'min_version': '7.10.2', 'empty': [], 'none': None }
+  Text = json.dumps(Index).encode('utf-8')
+  for Split in ((), ('snapshots', 'indices', 'empty', 'none')):
+    monkeypatch.setattr(ReadSizes, 'Largest', 0)
+    assert dict(ElasticSnap.StreamJSONObject(io.BytesIO(Text), ChunkSize=16, Split=Split)) == Index
+    if Split:
+      assert ReadSizes.Largest < len(json.dumps(Index['indices']['index-0'])) * 2
+    else:
+      assert ReadSizes.Largest > len(json.dumps(Index['indices'])) / 4
+
+
+def test_read_index_without_ijson(repository, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'ijson', None)
+  Generation = ElasticSnap.GetIndexLatest(repository)
+  with open('%s/index-%s' % (repository, Generation)) as File:
+    assert ElasticSnap.ReadIndex(repository, Generation) == json.load(File)
+
+
+def Checks(Count):
+  return dict(('indices/%s/0/__%05d' % ('é' if Number % 3 == 0 else 'i', Number), { 'sha1': '%040x' % (Number * 7919), 'size': Number * 1000 }) for Number in range(Count))
+
+
+def test_binary_checksums(tmp_path):
+  Expected = Checks(100)
+  ElasticSnap.WriteChecksums(str(tmp_path), 'uuid', ElasticSnap.ChecksumMap(Expected.items()), Format='binary')
+  FileName = str(tmp_path / 'checksums-uuid.bin')
+  assert ElasticSnap.ChecksumFileName(str(tmp_path), 'uuid') == FileName
+  with open(FileName, mode='rb') as File:
+    assert File.read(8) == ElasticSnap.CHECKSUM_MAGIC
+
+  Mapped = ElasticSnap.MappedChecksums(FileName)
+  assert len(Mapped) == len(Expected)
+  assert list(Mapped) == sorted(Expected, key=lambda RelFile: RelFile.encode('utf-8'))
+  for RelFile, Check in Expected.items():
+    assert Mapped[RelFile] == Check
+  for Missing in ('', 'indices', 'indices/i/0/__00001x', 'zzz'):
+    assert Missing not in Mapped
+  assert dict(ElasticSnap.ReadChecksums(str(tmp_path), 'uuid').items()) == Expected
+
+
+def test_binary_checksums_empty(tmp_path):
+  ElasticSnap.WriteChecksums(str(tmp_path), 'uuid', ElasticSnap.ChecksumMap(), Format='binary')
+  assert len(ElasticSnap.OpenChecksums(str(tmp_path), 'uuid')) == 0
+
+
+#a snapshot written again is converted, the file in the other format goes
+def test_checksum_format_switch(tmp_path):
+  Expected = Checks(10)
+  ElasticSnap.WriteChecksums(str(tmp_path), 'uuid', Expected, Format='json')
+  ElasticSnap.WriteChecksums(str(tmp_path), 'uuid', ElasticSnap.ReadChecksums(str(tmp_path), 'uuid'), Format='binary')
+  assert sorted(Path.name for Path in tmp_path.iterdir()) == [ 'checksums-uuid.bin' ]
+  ElasticSnap.WriteChecksums(str(tmp_path), 'uuid', ElasticSnap.ReadChecksums(str(tmp_path), 'uuid'), Format='json')
+  assert sorted(Path.name for Path in tmp_path.iterdir()) == [ 'checksums-uuid.json' ]
+  with open(str(tmp_path / 'checksums-uuid.json')) as File:
+    assert json.load(File) == Expected
+
+
+def test_not_a_checksums_file(tmp_path):
+  FileName = str(tmp_path / 'checksums-uuid.bin')
+  with open(FileName, mode='wb') as File:
+    File.write(b'NOTMAGIC' + bytes(8))
+  with pytest.raises(ValueError):
+    ElasticSnap.MappedChecksums(FileName)
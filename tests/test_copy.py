@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+import ElasticSnap
+
+
+#index-<gen> files in every shard folder of a repository
+def ShardGenerationFiles(Folder):
+  Files = set()
+  for Root, Dirs, Names in os.walk(Folder + '/indices'):
+    Files.update(os.path.relpath(Root + '/' + Name, Folder) for Name in Names if ElasticSnap.IsShardGeneration(os.path.relpath(Root + '/' + Name, Folder)))
+  return Files
+
+
+#shard generations some index-N of the repository refers to, no index-N is
+# removed by a copy so these are all the generations it ever committed
+def CommittedShardGenerations(Folder):
+  Files = set()
+  for Name in os.listdir(Folder):
+    if Name.startswith('index-') and Name[len('index-'):].isdigit():
+      with open(Folder + '/' + Name) as File:
+        Index = json.load(File)
+      for IndexInfo in Index['indices'].values():
+        for Shard, Generation in enumerate(IndexInfo.get('shard_generations', [])):
+          if Generation not in (None, '_deleted', '_new'):
+            Files.add('indices/%s/%s/index-%s' % (IndexInfo['id'], Shard, Generation))
+  return Files
+
+
+def test_copy_then_sync_with_commit_every(repository, tmp_path, capsys):
+  Dest = str(tmp_path / 'dst')
+  os.makedirs(Dest)
+  SrcRepo = ElasticSnap.Repository(repository)
+  ElasticSnap.CopySnapShot(SrcRepo, ElasticSnap.Repository(Dest), SrcRepo.ByName['snapshot-00002']['uuid'], Verify=False)
+  DestRepo = ElasticSnap.Repository(Dest)
+  ElasticSnap.SyncSnapShots(SrcRepo, DestRepo, ElasticSnap.CompareSnapShots(SrcRepo, DestRepo, Verbose=False), CommitEvery=2)
+  assert capsys.readouterr().out.count('Wrote index-') == 2
+
+  DestRepo = ElasticSnap.Repository(Dest)
+  assert sorted(DestRepo.ByName) == sorted(SrcRepo.ByName)
+  for IndexName, IndexInfo in DestRepo.Index['indices'].items():
+    #the index entries were merged into what the destination had
+    assert sorted(IndexInfo['snapshots']) == sorted(SrcRepo.Index['indices'][IndexName]['snapshots'])
+    Expected = sorted(DestRepo.GetSnapshotName(uuid) for uuid in IndexInfo['snapshots'])
+    for Shard, Generation in enumerate(IndexInfo['shard_generations']):
+      ShardFolder = '%s/indices/%s/%s' % (Dest, IndexInfo['id'], Shard)
+      ShardIndex = ElasticSnap.ReadBlob(ShardFolder + '/index-' + Generation)
+      #only destination snapshots, and every blob they list is there
+      assert sorted(ShardIndex['snapshots']) == Expected
+      for FileInfo in ShardIndex['files']:
+        for Blob, Size in ElasticSnap.GetFileParts(FileInfo):
+          assert os.path.getsize(ShardFolder + '/' + Blob) == Size
+  #generations written between two commits were replaced before any index-N
+  # referred to them
+  assert ShardGenerationFiles(Dest) == CommittedShardGenerations(Dest)
+  assert ElasticSnap.VerifySnapShots(DestRepo, list(DestRepo.ByUUID), Level='full') == 0
+
+
+def MakeFiles(Folder, Count):
+  Files = {}
+  for Number in range(Count):
+    RelFile = 'indices/i/%s/__%04d' % (Number % 3, Number)
+    Data = os.urandom(Number * 997 % 50000)
+    os.makedirs(os.path.dirname(Folder + '/' + RelFile), exist_ok=True)
+    with open(Folder + '/' + RelFile, mode='wb') as File:
+      File.write(Data)
+    Files[RelFile] = { 'sha1': hashlib.sha1(Data).hexdigest(), 'size': len(Data) }
+  return Files
+
+
+#the workers only return results, the calling thread merges them into the
+# checksums, the content map and the checkpoints
+def test_copy_file_list_merges_results(tmp_path, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'SmallFileSize', 20000)
+  monkeypatch.setattr(ElasticSnap, 'CheckpointInterval', 0)
+  Source = str(tmp_path / 'src')
+  Dest = str(tmp_path / 'dst')
+  Files = MakeFiles(Source, 200)
+  for Folder in set(os.path.dirname(RelFile) for RelFile in Files):
+    os.makedirs(Dest + '/' + Folder)
+  #already copied, with Verify off it is left alone
+  Known = 'indices/i/0/__0000'
+  SnapshotChecksums = ElasticSnap.ChecksumMap([ (Known, Files[Known]) ])
+  ContentMap = ElasticSnap.ChecksumMap()
+  Checkpoints = []
+  SnapshotChecksums, Progress = ElasticSnap.CopyFileList(Source, Dest, sorted(Files), SnapshotChecksums, Verify=False, Jobs=4, ContentMap=ContentMap, Checkpoint=lambda Checksums: Checkpoints.append(len(Checksums)))
+  assert dict(SnapshotChecksums.items()) == Files
+  assert dict(ContentMap.items()) == dict((RelFile, Check) for RelFile, Check in Files.items() if RelFile != Known)
+  assert not os.path.exists(Dest + '/' + Known)
+  for RelFile, Check in Files.items():
+    if RelFile != Known:
+      assert ElasticSnap.CalcChecksum(Dest + '/' + RelFile) == (Check['sha1'], Check['size'])
+  assert Checkpoints and Checkpoints == sorted(Checkpoints)
+
+
+def test_copy_file_list_error(tmp_path):
+  Source = str(tmp_path / 'src')
+  Dest = str(tmp_path / 'dst')
+  Files = MakeFiles(Source, 20)
+  for Folder in set(os.path.dirname(RelFile) for RelFile in Files):
+    os.makedirs(Dest + '/' + Folder)
+  with pytest.raises(ElasticSnap.FileError):
+    ElasticSnap.CopyFileList(Source, Dest, sorted(Files) + [ 'indices/i/0/__missing' ], ElasticSnap.ChecksumMap(), Jobs=4)
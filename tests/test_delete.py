@@ -0,0 +1,117 @@
+import json
+import os
+
+import ElasticSnap
+
+
+def SnapshotUUIDs(Repo, *Names):
+  return [ Repo.ByName[Name]['uuid'] for Name in Names ]
+
+
+#What checksums files written by older versions held: the shard index-<gen>
+# next to the blobs of every snapshot
+def AddShardGenerations(Folder):
+  Repo = ElasticSnap.Repository(Folder)
+  for snapshotUUID in Repo.ByUUID:
+    SnapshotChecksums = ElasticSnap.ReadChecksums(Folder, snapshotUUID)
+    for IndexName in Repo.GetIndexInSnapshot(snapshotUUID):
+      IndexInfo = Repo.Index['indices'][IndexName]
+      for Shard, Generation in enumerate(IndexInfo['shard_generations']):
+        RelFile = 'indices/%s/%s/index-%s' % (IndexInfo['id'], Shard, Generation)
+        file_sha1, filesize = ElasticSnap.CalcChecksum(Folder + '/' + RelFile)
+        SnapshotChecksums[RelFile] = { 'sha1': file_sha1, 'size': filesize }
+    Format = 'binary' if ElasticSnap.ChecksumFileName(Folder, snapshotUUID).endswith('.bin') else 'json'
+    ElasticSnap.WriteChecksums(Folder, snapshotUUID, SnapshotChecksums, Format=Format)
+
+
+def ListedShardGenerations(Folder):
+  Repo = ElasticSnap.Repository(Folder)
+  return [ RelFile for snapshotUUID in Repo.ByUUID for RelFile in ElasticSnap.ReadChecksums(Folder, snapshotUUID).keys() if ElasticSnap.IsShardGeneration(RelFile) ]
+
+
+def test_delete_then_verify(repository):
+  AddShardGenerations(repository)
+  Repo = ElasticSnap.Repository(repository)
+  ElasticSnap.DeleteSnapShots(Repo, SnapshotUUIDs(Repo, 'snapshot-00000', 'snapshot-00002'))
+
+  Repo = ElasticSnap.Repository(repository)
+  assert sorted(Repo.ByName) == [ 'snapshot-00001', 'snapshot-00003', 'snapshot-00004' ]
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='stat') == 0
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+  #the old generations were unlinked, the checksums do not list them anymore
+  assert ListedShardGenerations(repository) == []
+  Summary = ElasticSnap.ReadSummary(repository)
+  for snapshotUUID in Repo.ByUUID:
+    assert Summary[snapshotUUID]['files'] == len(ElasticSnap.ReadChecksums(repository, snapshotUUID))
+
+
+def test_delete_keeps_binary_checksums(repository):
+  Repo = ElasticSnap.Repository(repository)
+  for snapshotUUID in Repo.ByUUID:
+    ElasticSnap.WriteChecksums(repository, snapshotUUID, ElasticSnap.ReadChecksums(repository, snapshotUUID), Format='binary')
+  AddShardGenerations(repository)
+  Repo = ElasticSnap.Repository(repository)
+  ElasticSnap.DeleteSnapShots(Repo, SnapshotUUIDs(Repo, 'snapshot-00004'))
+
+  Repo = ElasticSnap.Repository(repository)
+  for snapshotUUID in Repo.ByUUID:
+    assert ElasticSnap.ChecksumFileName(repository, snapshotUUID).endswith('.bin')
+  assert ListedShardGenerations(repository) == []
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+
+
+#elasticsearch writes a new shard generation with every snapshot, --gc then
+# removes the one it replaced
+def test_gc_then_verify(repository):
+  AddShardGenerations(repository)
+  Repo = ElasticSnap.Repository(repository)
+  for IndexInfo in Repo.Index['indices'].values():
+    for Shard, Generation in enumerate(IndexInfo['shard_generations']):
+      ShardFolder = '%s/indices/%s/%s/' % (repository, IndexInfo['id'], Shard)
+      with open(ShardFolder + 'index-' + Generation, 'rb') as Old, open(ShardFolder + 'index-' + Generation + 'x', 'wb') as New:
+        New.write(Old.read())
+      IndexInfo['shard_generations'][Shard] = Generation + 'x'
+  Repo.Dirty = True
+  Repo.Write()
+
+  ElasticSnap.CollectGarbage(ElasticSnap.Repository(repository), DryRun=False)
+  Repo = ElasticSnap.Repository(repository)
+  assert ListedShardGenerations(repository) == []
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='stat') == 0
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+  with open(ElasticSnap.ChecksumFileName(repository, list(Repo.ByUUID)[0])) as f:
+    assert json.load(f)
+
+
+#a repository written before elasticsearch 7.6: no shard_generations, every
+# shard has numbered index-N files and the highest one counts
+def MakeNumbered(Folder):
+  Repo = ElasticSnap.Repository(Folder)
+  for IndexInfo in Repo.Index['indices'].values():
+    for Shard, Generation in enumerate(IndexInfo.pop('shard_generations')):
+      ShardFolder = '%s/indices/%s/%s/' % (Folder, IndexInfo['id'], Shard)
+      os.rename(ShardFolder + 'index-' + Generation, ShardFolder + 'index-0')
+  Repo.Dirty = True
+  Repo.Write()
+
+
+def CountBlobs(Folder):
+  return sum(1 for Root, Dirs, Files in os.walk(Folder + '/indices') for File in Files if File.startswith('__'))
+
+
+def test_delete_numbered_generations(repository):
+  MakeNumbered(repository)
+  Blobs = CountBlobs(repository)
+  Repo = ElasticSnap.Repository(repository)
+  ElasticSnap.DeleteSnapShots(Repo, SnapshotUUIDs(Repo, 'snapshot-00000', 'snapshot-00001'))
+
+  assert CountBlobs(repository) < Blobs
+  Repo = ElasticSnap.Repository(repository)
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+  for IndexInfo in Repo.Index['indices'].values():
+    assert 'shard_generations' not in IndexInfo
+    for Shard in ElasticSnap.ListShards('%s/indices/%s' % (repository, IndexInfo['id'])):
+      ShardFolder = '%s/indices/%s/%s' % (repository, IndexInfo['id'], Shard)
+      assert sorted(Name for Name in os.listdir(ShardFolder) if Name.startswith('index-')) == [ 'index-1' ]
+      ShardIndex = ElasticSnap.ReadBlob(ShardFolder + '/index-1')
+      assert sorted(ShardIndex['snapshots']) == sorted(Repo.ByName)
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+import ElasticSnap
+
+
+@pytest.fixture
+def archive(repository, tmp_path, monkeypatch):
+  #small reads, so a file that differs is found after some matching chunks
+  monkeypatch.setattr(ElasticSnap, 'BufferSize', 1024)
+  Repo = ElasticSnap.Repository(repository)
+  FileName = str(tmp_path / 'snapshot.tar')
+  ElasticSnap.ExportSnapShot(Repo, Repo.ByName['snapshot-00002']['uuid'], FileName)
+  return Repo, FileName
+
+
+@pytest.fixture
+def dest(tmp_path):
+  Folder = str(tmp_path / 'dst')
+  os.makedirs(Folder)
+  return Folder
+
+
+#Members of an archive as (name, bytes), in order
+def ReadArchive(FileName):
+  with tarfile.open(FileName) as Tar:
+    return [ (Member.name, Tar.extractfile(Member).read()) for Member in Tar ]
+
+
+def WriteArchive(FileName, Members):
+  with tarfile.open(FileName, mode='w') as Tar:
+    for Name, Data in Members:
+      Info = tarfile.TarInfo(Name)
+      Info.size = len(Data)
+      Tar.addfile(Info, io.BytesIO(Data))
+
+
+def PartialFiles(Folder):
+  return [ Root + '/' + Name for Root, Dirs, Names in os.walk(Folder) for Name in Names if Name.endswith(ElasticSnap.PartialSuffix) ]
+
+
+def test_export_import(archive, dest):
+  SrcRepo, FileName = archive
+  snapshotUUID = SrcRepo.ByName['snapshot-00002']['uuid']
+  Members = ReadArchive(FileName)
+  assert Members[0][0] == 'elasticsnap-export.json'
+  assert Members[-1][0] == 'elasticsnap-checksums.json'
+  assert sorted(Name for Name, Data in Members[1:-1]) == sorted(ElasticSnap.ListSnapShotFiles(SrcRepo, None, snapshotUUID))
+
+  ElasticSnap.ImportSnapShot(ElasticSnap.Repository(dest), FileName)
+  DestRepo = ElasticSnap.Repository(dest)
+  assert list(DestRepo.ByName) == [ 'snapshot-00002' ]
+  assert DestRepo.ByName['snapshot-00002']['uuid'] == snapshotUUID
+  assert not PartialFiles(dest)
+  assert ElasticSnap.VerifySnapShots(DestRepo, [ snapshotUUID ], Level='full') == 0
+
+  #the same snapshot is not imported twice
+  with pytest.raises(SystemExit):
+    ElasticSnap.ImportSnapShot(DestRepo, FileName)
+
+
+def test_import_manifest_mismatch(archive, dest, capsys):
+  SrcRepo, FileName = archive
+  Members = ReadArchive(FileName)
+  Manifest = json.loads(Members[-1][1])
+  Broken = Members[1][0]
+  Manifest[Broken]['sha1'] = '0' * 40
+  WriteArchive(FileName, Members[:-1] + [ ('elasticsnap-checksums.json', json.dumps(Manifest).encode('utf-8')) ])
+
+  with pytest.raises(SystemExit):
+    ElasticSnap.ImportSnapShot(ElasticSnap.Repository(dest), FileName)
+  Output = capsys.readouterr().out
+  assert 'Checksum mismatch : %s' % Broken in Output
+  assert '1 files do not match the archive manifest' in Output
+  #nothing was added and no file of the archive was left behind
+  assert not ElasticSnap.Repository(dest).ByName
+  assert not PartialFiles(dest)
+  assert not [ Name for Name, Data in Members[1:-1] if os.path.exists(dest + '/' + Name) ]
+
+
+def test_import_replaces_a_file_that_differs(archive, dest, capsys):
+  SrcRepo, FileName = archive
+  Members = ReadArchive(FileName)
+  Blobs = [ (Name, Data) for Name, Data in Members[1:-1] if len(Data) > 4 * 1024 ]
+  (Same, SameData), (Differs, DiffersData) = Blobs[:2]
+  for Name, Data in ((Same, SameData), (Differs, DiffersData[:3000] + bytes([ DiffersData[3000] ^ 1 ]) + DiffersData[3001:])):
+    os.makedirs(os.path.dirname(dest + '/' + Name), exist_ok=True)
+    with open(dest + '/' + Name, mode='wb') as File:
+      File.write(Data)
+  os.utime(dest + '/' + Same, ns=(1, 1))
+
+  ElasticSnap.ImportSnapShot(ElasticSnap.Repository(dest), FileName)
+  Output = capsys.readouterr().out
+  assert 'Replaced %s, it differed from the archive' % Differs in Output
+  assert Same not in Output
+  with open(dest + '/' + Differs, mode='rb') as File:
+    assert File.read() == DiffersData
+  #a file that matches is left as it is
+  assert os.stat(dest + '/' + Same).st_mtime_ns == 1
+  DestRepo = ElasticSnap.Repository(dest)
+  assert ElasticSnap.VerifySnapShots(DestRepo, list(DestRepo.ByUUID), Level='full') == 0
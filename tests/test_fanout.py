@@ -0,0 +1,81 @@
+import os
+import time
+
+import ElasticSnap
+
+
+def Destinations(tmp_path, *Names):
+  Folders = []
+  for Name in Names:
+    Folder = str(tmp_path / Name)
+    os.makedirs(Folder)
+    Folders.append(Folder)
+  return Folders
+
+
+def Fanout(Source, Folders, SnapshotUUIDs = None, Jobs = 4):
+  SrcRepo = ElasticSnap.Repository(Source)
+  if SnapshotUUIDs is None:
+    SnapshotUUIDs = [ snapshot['uuid'] for snapshot in SrcRepo.Index['snapshots'] ]
+  return ElasticSnap.SyncSnapShotsFanout(SrcRepo, [ ElasticSnap.Repository(Folder) for Folder in Folders ], SnapshotUUIDs, Jobs=Jobs)
+
+
+def AssertComplete(Folder, Names):
+  Repo = ElasticSnap.Repository(Folder)
+  assert sorted(Repo.ByName) == sorted(Names)
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+  for Root, Dirs, Files in os.walk(Folder):
+    assert not [ File for File in Files if File.endswith(ElasticSnap.PartialSuffix) ]
+
+
+#a writer that starts late on one destination, with a queue of one small
+# chunk it is left behind on every file of more than a chunk or two
+def test_fanout_catch_up(repository, tmp_path, monkeypatch, capsys):
+  class SlowWriter(ElasticSnap.FanoutWriter):
+    def run(self):
+      if '/slow/' in self.DestFileName:
+        time.sleep(0.2)
+      super().run()
+
+  monkeypatch.setattr(ElasticSnap, 'FanoutWriter', SlowWriter)
+  monkeypatch.setattr(ElasticSnap, 'FanoutQueue', 1)
+  monkeypatch.setattr(ElasticSnap, 'BufferSize', 1024)
+  Fast, Slow = Destinations(tmp_path, 'fast', 'slow')
+  assert Fanout(repository, [ Fast, Slow ])
+  Output = capsys.readouterr().out
+  assert '/slow is falling behind' in Output
+  assert '/fast is falling behind' not in Output
+  Names = list(ElasticSnap.Repository(repository).ByName)
+  AssertComplete(Fast, Names)
+  AssertComplete(Slow, Names)
+
+
+#a destination slowed down by its bandwidth limit is waited for instead
+def test_fanout_throttled_is_not_detached(repository, tmp_path, monkeypatch, capsys):
+  monkeypatch.setattr(ElasticSnap, 'FanoutQueue', 1)
+  monkeypatch.setattr(ElasticSnap, 'BufferSize', 8 * 1024)
+  monkeypatch.setattr(ElasticSnap, 'GetThrottle', lambda DestFileName: (lambda Count: time.sleep(ElasticSnap.FanoutStall * 1.5)) if '/slow/' in DestFileName else None)
+  Fast, Slow = Destinations(tmp_path, 'fast', 'slow')
+  SrcRepo = ElasticSnap.Repository(repository)
+  assert Fanout(repository, [ Fast, Slow ], [ SrcRepo.ByName['snapshot-00000']['uuid'] ])
+  assert 'falling behind' not in capsys.readouterr().out
+  AssertComplete(Fast, [ 'snapshot-00000' ])
+  AssertComplete(Slow, [ 'snapshot-00000' ])
+
+
+#a source file that can not be read holds back its snapshot, not the
+# destinations
+def test_fanout_source_error(repository, tmp_path, capsys):
+  SrcRepo = ElasticSnap.Repository(repository)
+  First, Second = [ SrcRepo.ByName[Name]['uuid'] for Name in ('snapshot-00000', 'snapshot-00001') ]
+  Shared = set(ElasticSnap.ListSnapShotFiles(SrcRepo, None, Second))
+  Lost = [ RelFile for RelFile in ElasticSnap.ListSnapShotFiles(SrcRepo, None, First) if RelFile not in Shared and os.path.basename(RelFile).startswith('__') ][0]
+  os.remove(repository + '/' + Lost)
+
+  Folders = Destinations(tmp_path, 'one', 'two')
+  assert not Fanout(repository, Folders, [ First, Second ])
+  Output = capsys.readouterr().out
+  assert 'Source error' in Output
+  assert 'Destination failed' not in Output
+  for Folder in Folders:
+    AssertComplete(Folder, [ 'snapshot-00001' ])
@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ElasticSnap
+
+
+def test_split_lanes(tmp_path, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'SmallFileSize', 1000)
+  monkeypatch.setattr(ElasticSnap, 'SmallJobs', 6)
+  Source = str(tmp_path)
+  for Name, Size in (('stat-small', 10), ('stat-large', 5000)):
+    with open(Source + '/' + Name, mode='wb') as File:
+      File.write(b'x' * Size)
+  Sizes = { 'meta-small': 1000, 'meta-large': 1001, 'stat-small': 999999 }
+  Checksums = ElasticSnap.ChecksumMap([ ('checked-small', { 'sha1': '0' * 40, 'size': 5 }), ('checked-large', { 'sha1': '0' * 40, 'size': 50000 }) ])
+  FileList = [ 'meta-small', 'meta-large', 'checked-small', 'checked-large', 'stat-small', 'stat-large', 'unknown' ]
+  Small, Large = ElasticSnap.SplitLanes(Source, FileList, 2, [ Sizes, Checksums ])
+  #the first size known wins, a file that is not there goes with the large ones
+  assert list(Small.Files) == [ 'meta-small', 'checked-small' ]
+  assert list(Large.Files) == [ 'meta-large', 'checked-large', 'stat-small', 'stat-large', 'unknown' ]
+  assert (Small.Name, Small.Limit, Small.MaxLimit) == ('small', 6, 6)
+  assert (Large.Name, Large.Limit, Large.MaxLimit) == ('large', 2, 2)
+
+  Small, Large = ElasticSnap.SplitLanes(Source, [ 'stat-small', 'stat-large' ], 2, [])
+  assert list(Small.Files) == [ 'stat-small' ]
+  monkeypatch.setattr(ElasticSnap, 'AutoJobs', True)
+  Small, Large = ElasticSnap.SplitLanes(Source, [], 2, [])
+  assert (Small.MaxLimit, Large.MaxLimit) == (6 * ElasticSnap.TuneFactor, 2 * ElasticSnap.TuneFactor)
+
+
+#one tuning round in which the lane finished Files files
+def Round(Lane, Clock, Files, Latency = 0.1):
+  Clock.Now += ElasticSnap.TuneInterval
+  for File in range(Files):
+    Lane.Running += 1
+    Lane.Finished(1000, Latency)
+  Lane.Tune()
+  return Lane.Limit
+
+
+def test_tune_bounds(clock, monkeypatch, capsys):
+  monkeypatch.setattr(ElasticSnap, 'AutoJobs', True)
+  Lane = ElasticSnap.TransferLane('small', [], 2)
+  #more files at a time keeps paying off: up to TuneFactor times the start
+  Limits = [ Round(Lane, clock, Files) for Files in range(10, 200, 10) ]
+  assert Limits[:3] == [ 3, 4, 5 ]
+  assert max(Limits) == Limits[-1] == 2 * ElasticSnap.TuneFactor
+  assert 'Tuning   : small files 3 at a time (was 2' in capsys.readouterr().out
+  #and while each file only gets slower, down to one file at a time
+  Limits = [ Round(Lane, clock, 190, Latency=0.1 * 2 ** Step) for Step in range(1, 12) ]
+  assert Limits[:2] == [ 7, 6 ]
+  assert min(Limits) == Limits[-1] == 1
+
+
+#a rate that holds while every file takes much longer steps down
+def test_tune_latency(clock, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'AutoJobs', True)
+  Lane = ElasticSnap.TransferLane('large', [], 4)
+  assert Round(Lane, clock, 10, Latency=0.1) == 5
+  assert Round(Lane, clock, 10, Latency=0.2) == 4
+  assert Round(Lane, clock, 10, Latency=0.2) == 4
+
+
+def test_no_tuning_without_auto_jobs(clock):
+  Lane = ElasticSnap.TransferLane('small', [], 3)
+  assert [ Round(Lane, clock, Files) for Files in (10, 20, 40) ] == [ 3, 3, 3 ]
+
+
+def test_token_bucket(clock, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'Metrics', ElasticSnap.RunMetrics())
+  Bucket = ElasticSnap.TokenBucket(1000)
+  #a full second of burst, then the debt is slept off
+  Bucket.Take(1000)
+  assert clock.Slept == []
+  Bucket.Take(500)
+  assert clock.Slept == [ pytest.approx(0.5) ]
+  #retried parts are reported as negative amounts
+  Bucket.Take(0)
+  Bucket.Take(-500)
+  assert len(clock.Slept) == 1
+  #an idle bucket fills up to one second of tokens only
+  clock.Now += 60
+  Bucket.Take(1500)
+  assert clock.Slept[-1] == pytest.approx(0.5)
+  #10000 bytes in small pieces take 10 seconds from an empty bucket
+  Start = clock.Now
+  for Piece in range(100):
+    Bucket.Take(100)
+  assert clock.Now - Start == pytest.approx(10)
+  assert ElasticSnap.Metrics.Counters['throttled_seconds'] == pytest.approx(sum(clock.Slept))
+
+
+#the limit holds for threads sharing one bucket
+def test_token_bucket_threads():
+  Bucket = ElasticSnap.TokenBucket(400 * 1024)
+  Start = time.monotonic()
+  with ThreadPoolExecutor(max_workers=4) as Pool:
+    list(Pool.map(lambda Piece: Bucket.Take(8 * 1024), range(100)))
+  #400 KiB of burst, the other 400 KiB at 400 KiB/s
+  assert time.monotonic() - Start >= 0.95
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+
+import ElasticSnap
+
+
+Sample = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[a-zA-Z_]+="[^"]*"\})? (-?[0-9.e+-]+)$')
+
+
+#Samples of a prometheus textfile, {name or name{label}: value}, every line
+# must be a sample or a TYPE comment of a metric not typed before
+def ReadTextfile(FileName):
+  Samples = {}
+  Types = {}
+  with open(FileName) as File:
+    Text = File.read()
+  assert Text.endswith('\n')
+  for Line in Text.splitlines():
+    if Line.startswith('#'):
+      Hash, Word, Name, Type = Line.split(' ')
+      assert Word == 'TYPE' and Name not in Types
+      Types[Name] = Type
+      continue
+    Match = Sample.match(Line)
+    assert Match, Line
+    Samples[Match.group(1) + (Match.group(2) or '')] = float(Match.group(3))
+  return Samples, Types
+
+
+def test_prometheus_textfile(clock, tmp_path):
+  Metrics = ElasticSnap.RunMetrics()
+  Metrics.Add('files_copied', 3)
+  Metrics.AddAll({ 'bytes_copied': 3 * 1024 * 1024, 'throttled_seconds': 0.12345 })
+  with Metrics.Phase('copy'):
+    clock.Now += 2.5
+  for Seconds in (0.0005, 0.002, 0.002, 7, 1000):
+    Metrics.Observe('file_copy_seconds', Seconds)
+  clock.Now += 1.5
+  FileName = str(tmp_path / 'run.prom')
+  Metrics.Write(FileName, Failed=True)
+  assert os.listdir(str(tmp_path)) == [ 'run.prom' ]
+
+  Samples, Types = ReadTextfile(FileName)
+  assert Samples['elasticsnap_run_start_seconds'] == 1000
+  assert Samples['elasticsnap_run_seconds'] == 4
+  assert Samples['elasticsnap_run_failed'] == 1
+  assert Samples['elasticsnap_phase_seconds{phase="copy"}'] == 2.5
+  assert Samples['elasticsnap_files_copied_total'] == 3
+  assert Samples['elasticsnap_bytes_copied_total'] == 3 * 1024 * 1024
+  assert Samples['elasticsnap_throttled_seconds_total'] == 0.123
+  assert Types == { 'elasticsnap_phase_seconds': 'gauge', 'elasticsnap_files_copied_total': 'counter', 'elasticsnap_bytes_copied_total': 'counter', 'elasticsnap_throttled_seconds_total': 'counter', 'elasticsnap_file_copy_seconds': 'histogram' }
+
+  #buckets count every observation up to their bound, +Inf all of them
+  Buckets = [ (Key, Value) for Key, Value in Samples.items() if Key.startswith('elasticsnap_file_copy_seconds_bucket') ]
+  assert [ Key for Key, Value in Buckets ] == [ 'elasticsnap_file_copy_seconds_bucket{le="%s"}' % Bound for Bound in list(ElasticSnap.LatencyBuckets) + [ '+Inf' ] ]
+  Counts = dict((Key[len('elasticsnap_file_copy_seconds_bucket{le="'):-2], Value) for Key, Value in Buckets)
+  assert (Counts['0.001'], Counts['0.005'], Counts['5'], Counts['10'], Counts['300'], Counts['+Inf']) == (1, 3, 3, 4, 4, 5)
+  assert Samples['elasticsnap_file_copy_seconds_count'] == 5
+  assert Samples['elasticsnap_file_copy_seconds_sum'] == 1007.005
+
+
+#other file names get the same report as json
+def test_metrics_json(clock, tmp_path):
+  Metrics = ElasticSnap.RunMetrics()
+  Metrics.Add('files_copied')
+  Metrics.Observe('file_copy_seconds', 0.02)
+  FileName = str(tmp_path / 'run.json')
+  Metrics.Write(FileName)
+  with open(FileName) as File:
+    Report = json.load(File)
+  assert Report['failed'] is False
+  assert Report['counters'] == { 'files_copied': 1 }
+  assert Report['histograms']['file_copy_seconds']['counts'][3] == 1
+
+
+#what a copy counts ends up in the textfile
+def test_prometheus_textfile_of_a_copy(repository, tmp_path, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'Metrics', ElasticSnap.RunMetrics())
+  Dest = str(tmp_path / 'dst')
+  os.makedirs(Dest)
+  SrcRepo = ElasticSnap.Repository(repository)
+  ElasticSnap.CopySnapShot(SrcRepo, ElasticSnap.Repository(Dest), SrcRepo.ByName['snapshot-00000']['uuid'], Verify=False)
+  FileName = str(tmp_path / 'copy.prom')
+  ElasticSnap.Metrics.Write(FileName)
+  Samples, Types = ReadTextfile(FileName)
+  Files = ElasticSnap.ListSnapShotFiles(SrcRepo, None, SrcRepo.ByName['snapshot-00000']['uuid'])
+  assert Samples['elasticsnap_files_copied_total'] == len(Files)
+  assert Samples['elasticsnap_bytes_copied_total'] == sum(os.path.getsize(repository + '/' + RelFile) for RelFile in Files)
+  assert Samples['elasticsnap_file_copy_seconds_count'] == len(Files)
+  assert Samples['elasticsnap_run_failed'] == 0
@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+import pytest
+
+import ElasticSnap
+
+
+Chunk = 64 * 1024
+
+
+#a copy that stops after Limit bytes, like a run that was killed
+class Interrupted(Exception):
+  pass
+
+
+def Interrupt(Limit):
+  Written = [ 0 ]
+  def Throttle(Count):
+    Written[0] += Count
+    if Written[0] > Limit:
+      raise Interrupted()
+  return lambda DestFileName: Throttle
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'JournalChunk', Chunk)
+  monkeypatch.setattr(ElasticSnap, 'BufferSize', 16 * 1024)
+  Data = os.urandom(Chunk * 5 + 1234)
+  FileName = str(tmp_path / 'blob')
+  with open(FileName, mode='wb') as File:
+    File.write(Data)
+  return FileName, Data
+
+
+def Resume(SrcFileName, DestFileName):
+  return ElasticSnap.ResumePartial(SrcFileName, DestFileName + ElasticSnap.PartialSuffix, DestFileName + ElasticSnap.JournalSuffix, os.stat(SrcFileName))
+
+
+def test_resume_after_interrupt(source, tmp_path, monkeypatch, capsys):
+  SrcFileName, Data = source
+  DestFileName = str(tmp_path / 'copy')
+  with monkeypatch.context() as Patch:
+    Patch.setattr(ElasticSnap, 'GetThrottle', Interrupt(Chunk * 2 + 5000))
+    with pytest.raises(ElasticSnap.FileError):
+      ElasticSnap.CopyFile(SrcFileName, DestFileName)
+  assert 'Kept the partial file' in capsys.readouterr().out
+  assert not os.path.exists(DestFileName)
+
+  hasher, Offset, Chunks = Resume(SrcFileName, DestFileName)
+  assert (Offset, len(Chunks)) == (Chunk * 2, 2)
+  assert hasher.hexdigest() == hashlib.sha1(Data[:Offset]).hexdigest()
+
+  assert ElasticSnap.CopyFile(SrcFileName, DestFileName) == (hashlib.sha1(Data).hexdigest(), len(Data))
+  assert 'Resuming copy' in capsys.readouterr().out
+  with open(DestFileName, mode='rb') as File:
+    assert File.read() == Data
+  assert not os.path.exists(DestFileName + ElasticSnap.PartialSuffix)
+  assert not os.path.exists(DestFileName + ElasticSnap.JournalSuffix)
+
+
+def test_resume_checks_the_partial_file(source, tmp_path, monkeypatch):
+  SrcFileName, Data = source
+  DestFileName = str(tmp_path / 'copy')
+  with monkeypatch.context() as Patch:
+    Patch.setattr(ElasticSnap, 'GetThrottle', Interrupt(Chunk * 4 + 10))
+    with pytest.raises(Interrupted):
+      ElasticSnap.CopyFileStream(SrcFileName, DestFileName)
+  assert Resume(SrcFileName, DestFileName)[1] == Chunk * 4
+
+  #a chunk that does not match its crc ends what can be trusted
+  with open(DestFileName + ElasticSnap.PartialSuffix, mode='r+b') as File:
+    File.seek(Chunk + 100)
+    File.write(b'\x00' if Data[Chunk + 100] else b'\x01')
+  assert Resume(SrcFileName, DestFileName)[1] == Chunk
+  assert ElasticSnap.CopyFileStream(SrcFileName, DestFileName) == (hashlib.sha1(Data).hexdigest(), len(Data))
+  with open(DestFileName, mode='rb') as File:
+    assert File.read() == Data
+
+
+#a source that changed since the journal was written is copied from the start
+def test_resume_source_changed(source, tmp_path, monkeypatch):
+  SrcFileName, Data = source
+  DestFileName = str(tmp_path / 'copy')
+  with monkeypatch.context() as Patch:
+    Patch.setattr(ElasticSnap, 'GetThrottle', Interrupt(Chunk * 3))
+    with pytest.raises(Interrupted):
+      ElasticSnap.CopyFileStream(SrcFileName, DestFileName)
+  assert Resume(SrcFileName, DestFileName)[1] > 0
+  Data = os.urandom(len(Data))
+  with open(SrcFileName, mode='wb') as File:
+    File.write(Data)
+  os.utime(SrcFileName, ns=(1, 1))
+  assert Resume(SrcFileName, DestFileName)[1] == 0
+  assert ElasticSnap.CopyFileStream(SrcFileName, DestFileName) == (hashlib.sha1(Data).hexdigest(), len(Data))
+
+
+#files up to one journal chunk are copied without a journal
+def test_small_file_has_no_journal(tmp_path, monkeypatch):
+  monkeypatch.setattr(ElasticSnap, 'JournalChunk', Chunk)
+  SrcFileName = str(tmp_path / 'small')
+  with open(SrcFileName, mode='wb') as File:
+    File.write(b'x' * Chunk)
+  DestFileName = str(tmp_path / 'copy')
+  with monkeypatch.context() as Patch:
+    Patch.setattr(ElasticSnap, 'GetThrottle', Interrupt(100))
+    with pytest.raises(Interrupted):
+      ElasticSnap.CopyFileStream(SrcFileName, DestFileName)
+  assert not os.path.exists(DestFileName + ElasticSnap.JournalSuffix)
+  assert Resume(SrcFileName, DestFileName)[1] == 0
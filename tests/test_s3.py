@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+import ElasticSnap
+
+
+#buckets bkt1 and bkt2 in an in-process moto server, with the client cache of
+# ElasticSnap emptied so every test gets clients that talk to it
+@pytest.fixture
+def s3(monkeypatch):
+  for Name in ('AWS_ENDPOINT_URL', 'AWS_PROFILE'):
+    monkeypatch.delenv(Name, raising=False)
+  monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+  monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+  monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+  monkeypatch.setattr(ElasticSnap, 'Buckets', {})
+  with moto.mock_aws():
+    Client = boto3.client('s3')
+    for Bucket in ('bkt1', 'bkt2'):
+      Client.create_bucket(Bucket=Bucket)
+    yield Client
+
+
+def Sync(SrcFolder, DestFolder):
+  SrcRepo = ElasticSnap.Repository(SrcFolder)
+  DestRepo = ElasticSnap.Repository(DestFolder)
+  MissingDest = ElasticSnap.CompareSnapShots(SrcRepo, DestRepo, Verbose=False)
+  ElasticSnap.SyncSnapShots(SrcRepo, DestRepo, MissingDest, Jobs=4)
+  return MissingDest
+
+
+def AllChecksums(Folder):
+  Repo = ElasticSnap.Repository(Folder)
+  return dict((snapshotUUID, dict(ElasticSnap.ReadChecksums(Folder, snapshotUUID).items())) for snapshotUUID in Repo.ByUUID)
+
+
+#local -> S3 -> S3 -> local, the last copy must be the repository it started as
+def test_sync_through_s3(s3, repository, tmp_path):
+  Names = sorted(ElasticSnap.Repository(repository).ByName)
+  assert len(Sync(repository, 's3://bkt1/repo')) == len(Names)
+  assert sorted(ElasticSnap.Repository('s3://bkt1/repo').ByName) == Names
+  assert len(Sync('s3://bkt1/repo', 's3://bkt2/copy')) == len(Names)
+  Local = str(tmp_path / 'back')
+  os.makedirs(Local)
+  assert len(Sync('s3://bkt2/copy', Local)) == len(Names)
+
+  Repo = ElasticSnap.Repository(Local)
+  assert sorted(Repo.ByName) == Names
+  assert ElasticSnap.VerifySnapShots(Repo, list(Repo.ByUUID), Level='full') == 0
+  Expected = AllChecksums(repository)
+  for Folder in ('s3://bkt1/repo', 's3://bkt2/copy', Local):
+    Checks = AllChecksums(Folder)
+    for snapshotUUID, SnapshotChecksums in Checks.items():
+      for RelFile, Check in SnapshotChecksums.items():
+        if RelFile in Expected[snapshotUUID]:
+          assert Check == Expected[snapshotUUID][RelFile]
+
+  #a second sync finds nothing to do
+  assert Sync(repository, 's3://bkt1/repo') == []
+  assert Sync('s3://bkt1/repo', 's3://bkt2/copy') == []
+
+
+#the sha1 of an upload is taken from the parts as they are read, also when
+# the file goes up in several parts
+@pytest.mark.parametrize('Size', [ 0, 1000, 11 * 1024 * 1024 + 17 ])
+def test_upload_hash(s3, tmp_path, monkeypatch, Size):
+  monkeypatch.setattr(ElasticSnap, 'S3PartSize', 5 * 1024 * 1024)
+  Data = os.urandom(Size)
+  FileName = str(tmp_path / 'blob')
+  with open(FileName, mode='wb') as File:
+    File.write(Data)
+  Storage = ElasticSnap.GetStorage('s3://bkt1/x')
+  assert Storage.Upload(FileName, 's3://bkt1/repo/blob') == (hashlib.sha1(Data).hexdigest(), Size)
+  assert s3.get_object(Bucket='bkt1', Key='repo/blob')['Body'].read() == Data
+  assert Storage.Checksum('s3://bkt1/repo/blob') == (hashlib.sha1(Data).hexdigest(), Size)
+  assert Storage.Stat('s3://bkt1/repo/blob').st_size == Size
+  with pytest.raises(FileNotFoundError):
+    Storage.Stat('s3://bkt1/repo/missing')
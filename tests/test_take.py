@@ -0,0 +1,74 @@
+import json
+
+import ElasticSnap
+
+
+Concurrent = { 'error': { 'type': 'concurrent_snapshot_execution_exception' }, 'status': 503 }
+
+
+class Response:
+  def __init__(self, status_code, Data):
+    self.status_code = status_code
+    self.text = json.dumps(Data)
+
+  def json(self):
+    return json.loads(self.text)
+
+
+#Elasticsearch as TakeSnapShots sees it. Busy holds how many times a start
+# is refused because another snapshot runs, States the answers to _status,
+# None for a failed request. Every request is logged with the time it came.
+class FakeClient:
+  def __init__(self, Clock, Existing, Busy, States):
+    self.Clock = Clock
+    self.Existing = Existing
+    self.Busy = Busy
+    self.States = States
+    self.Log = []
+
+  def Call(self, Method, Path, What, SendJSON = None):
+    assert (Method, Path) == ('GET', '/_cat/snapshots/repo?format=json')
+    return [ { 'id': Name } for Name in self.Existing ]
+
+  def Request(self, Method, Path, SendJSON = None):
+    Name = Path.split('/')[3]
+    self.Log.append((self.Clock.Now, Method, Name))
+    if Method == 'PUT':
+      assert SendJSON['indices'] == 'index-' + Name
+      if self.Busy.get(Name):
+        self.Busy[Name] -= 1
+        return Response(503, Concurrent)
+      return Response(200, { 'accepted': True })
+    State = self.States[Name].pop(0)
+    if State is None:
+      return Response(404, { 'error': 'snapshot_missing_exception' })
+    return Response(200, { 'snapshots': [ { 'state': State, 'shards_stats': { 'done': 1, 'total': 2 }, 'stats': {} } ] })
+
+  def Times(self, Method, Name):
+    return [ Now for Now, LogMethod, LogName in self.Log if (LogMethod, LogName) == (Method, Name) ]
+
+
+def Job(Name):
+  return { 'repo': 'repo', 'name': Name, 'indices': 'index-' + Name }
+
+
+def test_take_snapshots(clock, capsys):
+  Start = clock.Now
+  States = { 'busy': [ 'SUCCESS' ], 'slow': [ 'IN_PROGRESS' ] * 8 + [ 'SUCCESS' ], 'lost': [ None ] * ElasticSnap.StatusPollErrors, 'failed': [ None, 'FAILED' ] }
+  Client = FakeClient(clock, [ 'exists' ], { 'busy': 2 }, States)
+  assert ElasticSnap.TakeSnapShots(Client, [ Job(Name) for Name in ('exists', 'busy', 'slow', 'lost', 'failed') ]) == 2
+  assert not [ Name for Name, Left in States.items() if Left ]
+
+  #a snapshot of the same name is left alone
+  assert not Client.Times('PUT', 'exists')
+  assert 'A snapshot with the same name already exists' in capsys.readouterr().out
+  #a start refused while another snapshot runs is tried again, less often
+  assert Client.Times('PUT', 'busy') == [ Start, Start + 1, Start + 3 ]
+  assert Client.Times('GET', 'busy') == [ Start + 4 ]
+  #a running snapshot is polled less often the longer it runs, up to StatusPollMax
+  Polls = Client.Times('GET', 'slow')
+  assert [ Later - Earlier for Earlier, Later in zip([ Start ] + Polls, Polls) ] == [ 1, 1, 2, 4, 8, 16, 32, 60, 60 ]
+  #a failed status request is retried until StatusPollErrors in a row failed
+  assert len(Client.Times('GET', 'lost')) == ElasticSnap.StatusPollErrors
+  #nothing is slept but the wait for the next request due
+  assert clock.Now == max(Now for Now, Method, Name in Client.Log)
@@ -0,0 +1,52 @@
+import os
+
+import ElasticSnap
+
+
+def ShardFolder(Repo, IndexName, Shard):
+  return Repo.Folder + '/indices/' + Repo.Index['indices'][IndexName]['id'] + '/' + str(Shard)
+
+
+#the shard generation files are left out however the sizes are found
+def test_usage_without_shard_generations(repository):
+  Repo = ElasticSnap.Repository(repository)
+  snapshotUUID = Repo.ByName['snapshot-00002']['uuid']
+  Sizes = ElasticSnap.GetSnapshotFileSizes(Repo, snapshotUUID)
+  assert Sizes and not [ RelFile for RelFile in Sizes if ElasticSnap.IsShardGeneration(RelFile) ]
+  Expected = dict((RelFile, os.path.getsize(repository + '/' + RelFile)) for RelFile in ElasticSnap.ListSnapShotFiles(Repo, None, snapshotUUID))
+  assert Sizes == Expected
+
+  #shard metadata that can not be read, the checksums file is used
+  Folder = ShardFolder(Repo, 'index-00000', 0)
+  for Name in os.listdir(Folder):
+    if Name.startswith('index-') or Name == 'snap-%s.dat' % snapshotUUID:
+      with open(Folder + '/' + Name, mode='wb') as File:
+        File.write(b'broken')
+  Generations = [ Name for Name in os.listdir(Folder) if Name.startswith('index-') ]
+  assert Generations
+  Checksums = ElasticSnap.ReadChecksums(repository, snapshotUUID)
+  RelFolder = os.path.relpath(Folder, repository)
+  for Name in Generations:
+    Checksums[RelFolder + '/' + Name] = { 'sha1': '0' * 40, 'size': 6 }
+  ElasticSnap.WriteChecksums(repository, snapshotUUID, Checksums)
+  Sizes = ElasticSnap.GetSnapshotFileSizes(Repo, snapshotUUID)
+  assert not [ RelFile for RelFile in Sizes if ElasticSnap.IsShardGeneration(RelFile) ]
+  assert RelFolder + '/snap-%s.dat' % snapshotUUID in Sizes
+
+  #and without checksums everything in the index folder
+  os.remove(ElasticSnap.ChecksumFileName(repository, snapshotUUID))
+  Sizes = ElasticSnap.GetSnapshotFileSizes(Repo, snapshotUUID)
+  assert RelFolder + '/snap-%s.dat' % snapshotUUID in Sizes
+  assert not [ RelFile for RelFile in Sizes if ElasticSnap.IsShardGeneration(RelFile) ]
+
+
+def test_disk_usage_totals(repository):
+  Repo = ElasticSnap.Repository(repository)
+  Usage = ElasticSnap.GetRepositoryUsage(Repo, Jobs=2)
+  Files = {}
+  for snapshotUUID in Repo.ByUUID:
+    Listed = ElasticSnap.ListSnapShotFiles(Repo, None, snapshotUUID)
+    Files.update((RelFile, os.path.getsize(repository + '/' + RelFile)) for RelFile in Listed)
+    assert Usage['snapshots'][snapshotUUID]['files'] == len(Listed)
+  assert Usage['unique_files'] == len(Files)
+  assert Usage['unique_bytes'] == sum(Files.values())
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+import ElasticSnap
+
+
+def Names(Folder):
+  return sorted(ElasticSnap.Repository(Folder).ByName)
+
+
+def CopyNames(SrcFolder, DestFolder, *SnapshotNames):
+  SrcRepo = ElasticSnap.Repository(SrcFolder)
+  ElasticSnap.SyncSnapShots(SrcRepo, ElasticSnap.Repository(DestFolder), [ SrcRepo.ByName[Name]['uuid'] for Name in SnapshotNames ])
+
+
+@pytest.fixture
+def folders(repository, tmp_path):
+  Source = str(tmp_path / 'src')
+  Dest = str(tmp_path / 'dst')
+  os.makedirs(Source)
+  os.makedirs(Dest)
+  CopyNames(repository, Source, 'snapshot-00000', 'snapshot-00001', 'snapshot-00002')
+  return repository, Source, Dest
+
+
+#Each poll of the watch runs the next step, the last one stops it
+def Watch(monkeypatch, Source, Dest, Steps):
+  Steps = list(Steps)
+  def Sleep(Seconds):
+    if not Steps:
+      raise KeyboardInterrupt
+    Steps.pop(0)()
+  monkeypatch.setattr(ElasticSnap.time, 'sleep', Sleep)
+  ElasticSnap.WatchSnapShots(Source, Dest, 0.01)
+  assert not Steps
+
+
+def test_watch_follows_the_source(folders, monkeypatch, capsys):
+  Full, Source, Dest = folders
+  Watermarks = []
+
+  def AddSnapshot():
+    assert Names(Dest) == [ 'snapshot-00000', 'snapshot-00001', 'snapshot-00002' ]
+    CopyNames(Full, Source, 'snapshot-00003')
+
+  def DeleteSnapshot():
+    assert Names(Dest) == [ 'snapshot-00000', 'snapshot-00001', 'snapshot-00002', 'snapshot-00003' ]
+    Repo = ElasticSnap.Repository(Source)
+    ElasticSnap.DeleteSnapShots(Repo, [ Repo.ByName['snapshot-00001']['uuid'] ])
+
+  def Unchanged():
+    Watermarks.append(ElasticSnap.ReadWatermark(Dest, Source))
+
+  Watch(monkeypatch, Source, Dest, [ AddSnapshot, DeleteSnapshot, Unchanged ])
+  #the destination keeps what the source deleted
+  assert Names(Dest) == [ 'snapshot-00000', 'snapshot-00001', 'snapshot-00002', 'snapshot-00003' ]
+  SrcRepo = ElasticSnap.Repository(Source)
+  assert Watermarks[0]['generation'] == SrcRepo.Generation
+  assert sorted(Watermarks[0]['snapshots']) == sorted(SrcRepo.ByUUID)
+  Output = capsys.readouterr().out
+  assert Output.count(', 0 new snapshots') == 1
+  assert Output.count(', 1 new snapshots') == 1
+  DestRepo = ElasticSnap.Repository(Dest)
+  assert ElasticSnap.VerifySnapShots(DestRepo, list(DestRepo.ByUUID), Level='full') == 0
+
+  #a restarted watch trusts the watermark while the source stays the same
+  Watch(monkeypatch, Source, Dest, [])
+  Output = capsys.readouterr().out
+  assert 'Synced up to generation %s' % SrcRepo.Generation in Output
+  assert 'new snapshots' not in Output
+
+
+def test_plain_sync_writes_no_watermark(folders, monkeypatch):
+  Full, Source, Dest = folders
+  #main() sets these from the options, they are put back after the test
+  for Name in ('BufferSize', 'CopyMethod', 'Cache', 'ChecksumFormat', 'SmallJobs', 'AutoJobs', 'Bandwidth'):
+    monkeypatch.setattr(ElasticSnap, Name, getattr(ElasticSnap, Name))
+  monkeypatch.setattr(sys, 'argv', [ 'ElasticSnap.py', '--sync', '--src=' + Source, '--dst=' + Dest ])
+  ElasticSnap.main()
+  assert Names(Dest) == Names(Source)
+  assert not os.path.exists(Dest + '/elasticsnap-watermark.json')